@@ -3,7 +3,7 @@
 Fixed PDB organism extraction - corrected GraphQL query and REST API approach
 """
 
-import requests
+import httpx
 import json
 import time
 
@@ -56,7 +56,7 @@ def try_corrected_graphql(pdb_id):
     """
     
     try:
-        response = requests.post(
+        response = httpx.post(
             'https://data.rcsb.org/graphql',
             json={'query': query, 'variables': {'pdb_id': pdb_id}},
             headers={'Content-Type': 'application/json'},
@@ -110,7 +110,7 @@ def try_rest_entities(pdb_id):
     # Try the polymer entities endpoint
     try:
         url = f"https://data.rcsb.org/rest/v1/core/polymer_entities/{pdb_id}"
-        response = requests.get(url, headers={'Accept': 'application/json'}, timeout=30)
+        response = httpx.get(url, headers={'Accept': 'application/json'}, timeout=30)
         
         if response.status_code == 200:
             entities = response.json()
@@ -149,7 +149,7 @@ def try_entry_rest(pdb_id):
     
     try:
         url = f"https://data.rcsb.org/rest/v1/core/entry/{pdb_id}"
-        response = requests.get(url, headers={'Accept': 'application/json'}, timeout=30)
+        response = httpx.get(url, headers={'Accept': 'application/json'}, timeout=30)
         
         if response.status_code == 200:
             entry = response.json()
@@ -214,7 +214,7 @@ def fetch_detailed_metadata_fixed(pdb_ids):
             
             # Fetch entry-level data
             entry_url = f"https://data.rcsb.org/rest/v1/core/entry/{pdb_id}"
-            entry_response = requests.get(
+            entry_response = httpx.get(
                 entry_url,
                 headers={'Accept': 'application/json'},
                 timeout=30